@@ -1,4 +1,5 @@
 import discord
+from discord import app_commands
 from discord.ext import commands, tasks
 import asyncio
 import os
@@ -6,15 +7,129 @@ import random
 import mysql.connector
 from datetime import datetime, timedelta
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import gzip
+import queue
+import shutil
+import time
 import json
 import aiohttp
+from collections import deque
 from typing import Optional
 
-# Set up logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logging configuration
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_DIR = os.getenv('LOG_DIR', '/app/logs')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(5 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+# Context attributes (passed via `extra=`) copied into JSON log records
+LOG_CONTEXT_FIELDS = ('guild_id', 'user_id', 'channel_id', 'duration_ms')
+
+class JsonLogFormatter(logging.Formatter):
+    """Format records as one JSON object per line"""
+    
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in LOG_CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+LOG_SAFE_ARG_TYPES = (str, int, float, bool, type(None))
+
+class DeferredQueueHandler(QueueHandler):
+    """Hand records to the listener thread unformatted, so the event loop never formats"""
+    
+    def prepare(self, record):
+        # Live objects (discord models etc.) may change under the listener thread; snapshot them
+        if not isinstance(record.msg, str):
+            record.msg = str(record.msg)
+        if isinstance(record.args, dict):
+            record.args = {key: self.snapshot(value) for key, value in record.args.items()}
+        elif record.args:
+            record.args = tuple(self.snapshot(arg) for arg in record.args)
+        return record
+    
+    @staticmethod
+    def snapshot(value):
+        return value if isinstance(value, LOG_SAFE_ARG_TYPES) else str(value)
+
+def compress_rotated_log(source, dest):
+    """Gzip a rotated log file"""
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+def build_log_file_handler(log_dir, max_bytes, backup_count):
+    """Create the size-rotated, gzipped JSON log file handler"""
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = RotatingFileHandler(
+        os.path.join(log_dir, 'funkbot.log'),
+        maxBytes=max_bytes,
+        backupCount=backup_count,
+        encoding='utf-8',
+        delay=True
+    )
+    file_handler.setFormatter(JsonLogFormatter())
+    file_handler.namer = lambda name: f"{name}.gz"
+    file_handler.rotator = compress_rotated_log
+    return file_handler
+
+def setup_logging():
+    """Route all logging through a queue drained by a background listener thread"""
+    level = logging.getLevelName(LOG_LEVEL)
+    if not isinstance(level, int):
+        level = logging.INFO
+    
+    # Human-readable stdout for Dozzle/docker logs
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+    handlers = [console_handler]
+    
+    # Structured, size-rotated, gzipped files in the logs volume
+    file_error = None
+    try:
+        handlers.append(build_log_file_handler(LOG_DIR, LOG_MAX_BYTES, LOG_BACKUP_COUNT))
+    except OSError as err:
+        file_error = err
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.handlers.clear()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    root.setLevel(level)
+    
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
+    if file_error:
+        logging.getLogger(__name__).warning("File logging disabled, cannot write to %s: %s", LOG_DIR, file_error)
+    return listener
+
+def log_context(member=None, channel=None, started=None):
+    """Build `extra=` context for structured log records"""
+    context = {}
+    if member is not None:
+        context['guild_id'] = member.guild.id
+        context['user_id'] = member.id
+    if channel is not None:
+        context['channel_id'] = channel.id
+    if started is not None:
+        context['duration_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    return context
+
+log_listener = setup_logging()
 logger = logging.getLogger(__name__)
 
 # Bot configuration with slash commands
@@ -23,7 +138,15 @@ intents.voice_states = True
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+class FunkBot(commands.Bot):
+    """Bot with shutdown cleanup for background workers"""
+    
+    async def close(self):
+        await shutdown_load_shedding()
+        await stop_ha_worker()
+        await super().close()
+
+bot = FunkBot(command_prefix='!', intents=intents)
 
 # Enhanced join messages with emojis
 JOIN_MESSAGES = [
@@ -66,13 +189,39 @@ DB_CONFIG = {
     'charset': 'utf8mb4'
 }
 
+# Optional Home Assistant integration (disabled unless both are set)
+HA_URL = (os.getenv('HA_URL') or '').rstrip('/')
+HA_TOKEN = os.getenv('HA_TOKEN')
+HA_COALESCE_SECONDS = float(os.getenv('HA_COALESCE_SECONDS', '2'))
+HA_MAX_PENDING = int(os.getenv('HA_MAX_PENDING', '100'))
+HA_MAX_BACKOFF_SECONDS = float(os.getenv('HA_MAX_BACKOFF_SECONDS', '300'))
+
+# Load shedding during voice-event storms (e.g. a stage event starting or ending)
+OVERLOAD_EVENT_RATE = float(os.getenv('OVERLOAD_EVENT_RATE', '10'))  # voice events per second
+OVERLOAD_LOOP_LAG_MS = float(os.getenv('OVERLOAD_LOOP_LAG_MS', '250'))
+OVERLOAD_RATE_WINDOW_SECONDS = float(os.getenv('OVERLOAD_RATE_WINDOW_SECONDS', '10'))
+OVERLOAD_COOLDOWN_SECONDS = float(os.getenv('OVERLOAD_COOLDOWN_SECONDS', '30'))
+OVERLOAD_SUMMARY_SECONDS = float(os.getenv('OVERLOAD_SUMMARY_SECONDS', '60'))
+MAX_INFLIGHT_ANNOUNCEMENTS = int(os.getenv('MAX_INFLIGHT_ANNOUNCEMENTS', '4'))
+MAX_INFLIGHT_DB = int(os.getenv('MAX_INFLIGHT_DB', '3'))  # concurrent bookkeeping DB connections
+MAX_DEFERRED_STATS = int(os.getenv('MAX_DEFERRED_STATS', '5000'))
+STATS_REPLAY_MAX_ATTEMPTS = int(os.getenv('STATS_REPLAY_MAX_ATTEMPTS', '3'))
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv('SHUTDOWN_DRAIN_SECONDS', '8'))  # under docker stop's 10s grace
+MAX_SUMMARY_EMBEDS = int(os.getenv('MAX_SUMMARY_EMBEDS', '3'))  # per announcement channel per flush
+
+# Discord embed limits
+EMBED_MAX_FIELDS = 25
+EMBED_FIELD_NAME_LIMIT = 256
+EMBED_FIELD_VALUE_LIMIT = 1024
+EMBED_TOTAL_LIMIT = 6000
+
 def get_db_connection():
     """Get database connection with retry logic"""
     try:
         connection = mysql.connector.connect(**DB_CONFIG)
         return connection
     except mysql.connector.Error as err:
-        logger.error(f"Database connection failed: {err}")
+        logger.error("Database connection failed: %s", err)
         return None
 
 def init_database():
@@ -143,7 +292,7 @@ def init_database():
         return True
         
     except mysql.connector.Error as err:
-        logger.error(f"Database initialization failed: {err}")
+        logger.error("Database initialization failed: %s", err)
         return False
     finally:
         if connection.is_connected():
@@ -198,11 +347,15 @@ def check_achievements(guild_id, user_id, session_data, user_stats):
     
     return new_achievements
 
-async def log_voice_join(member, channel):
-    """Log voice channel join to database"""
+def log_voice_join(member, channel, hold_stats=False):
+    """Log voice channel join to database (blocking; run via run_bookkeeping)
+
+    Returns (session_id, held stats update). With hold_stats the aggregate stats
+    update is returned for the caller to queue instead of being applied.
+    """
     connection = get_db_connection()
     if not connection:
-        return False
+        return False, None
     
     try:
         cursor = connection.cursor()
@@ -215,62 +368,75 @@ async def log_voice_join(member, channel):
         
         session_id = cursor.lastrowid
         
-        # Update user stats
-        cursor.execute("""
-            INSERT INTO user_stats (guild_id, user_id, username, total_joins, channels_visited, achievements)
-            VALUES (%s, %s, %s, 1, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            total_joins = total_joins + 1,
-            username = VALUES(username),
-            last_join = NOW(),
-            channels_visited = JSON_MERGE_PATCH(
-                COALESCE(channels_visited, '{}'),
-                JSON_OBJECT(%s, COALESCE(JSON_EXTRACT(channels_visited, %s), 0) + 1)
-            )
-        """, (
-            member.guild.id, member.id, member.display_name,
-            json.dumps({channel.name: 1}),
-            json.dumps([]),
-            channel.name, f'$."{channel.name}"'
-        ))
-        
-        # Update daily stats
-        today = datetime.now().date()
-        cursor.execute("""
-            INSERT INTO daily_stats (guild_id, user_id, username, date, joins_count, channels_visited, first_join_time)
-            VALUES (%s, %s, %s, %s, 1, %s, %s)
-            ON DUPLICATE KEY UPDATE
-            joins_count = joins_count + 1,
-            username = VALUES(username),
-            channels_visited = JSON_MERGE_PATCH(
-                COALESCE(channels_visited, '{}'),
-                JSON_OBJECT(%s, COALESCE(JSON_EXTRACT(channels_visited, %s), 0) + 1)
-            ),
-            first_join_time = COALESCE(first_join_time, VALUES(first_join_time))
-        """, (
-            member.guild.id, member.id, member.display_name, today,
-            json.dumps([channel.name]),
-            datetime.now().time(),
-            channel.name, f'$."{channel.name}"'
-        ))
+        # Aggregate stats can wait while we're shedding load; the session row can't
+        stats_update = (apply_join_stats, (member.guild.id, member.id, member.display_name, channel.name, datetime.now()))
+        if hold_stats:
+            held = stats_update
+        else:
+            held = None
+            stats_update[0](cursor, *stats_update[1])
         
         connection.commit()
-        logger.info(f"Logged join: {member.display_name} -> {channel.name}")
-        return session_id
+        logger.info("Logged join: %s -> %s", member.display_name, channel.name,
+                    extra=log_context(member, channel))
+        return session_id, held
         
     except mysql.connector.Error as err:
-        logger.error(f"Failed to log voice join: {err}")
-        return False
+        logger.error("Failed to log voice join: %s", err, extra=log_context(member, channel))
+        return False, None
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
-async def log_voice_leave(member, channel, join_time):
-    """Log voice channel leave and calculate duration"""
+def apply_join_stats(cursor, guild_id, user_id, username, channel_name, joined_at):
+    """Count a join in user_stats and daily_stats"""
+    # Update user stats
+    cursor.execute("""
+        INSERT INTO user_stats (guild_id, user_id, username, total_joins, last_join, channels_visited, achievements)
+        VALUES (%s, %s, %s, 1, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        total_joins = total_joins + 1,
+        username = VALUES(username),
+        last_join = VALUES(last_join),
+        channels_visited = JSON_MERGE_PATCH(
+            COALESCE(channels_visited, '{}'),
+            JSON_OBJECT(%s, COALESCE(JSON_EXTRACT(channels_visited, %s), 0) + 1)
+        )
+    """, (
+        guild_id, user_id, username, joined_at,
+        json.dumps({channel_name: 1}),
+        json.dumps([]),
+        channel_name, f'$."{channel_name}"'
+    ))
+    
+    # Update daily stats
+    cursor.execute("""
+        INSERT INTO daily_stats (guild_id, user_id, username, date, joins_count, channels_visited, first_join_time)
+        VALUES (%s, %s, %s, %s, 1, %s, %s)
+        ON DUPLICATE KEY UPDATE
+        joins_count = joins_count + 1,
+        username = VALUES(username),
+        channels_visited = JSON_MERGE_PATCH(
+            COALESCE(channels_visited, '{}'),
+            JSON_OBJECT(%s, COALESCE(JSON_EXTRACT(channels_visited, %s), 0) + 1)
+        ),
+        first_join_time = COALESCE(first_join_time, VALUES(first_join_time))
+    """, (
+        guild_id, user_id, username, joined_at.date(),
+        json.dumps([channel_name]),
+        joined_at.time(),
+        channel_name, f'$."{channel_name}"'
+    ))
+
+def log_voice_leave(member, channel, join_time, hold_stats=False):
+    """Log voice channel leave and calculate duration (blocking; run via run_bookkeeping)
+
+    Returns (duration, held stats update), like log_voice_join.
+    """
     connection = get_db_connection()
     if not connection:
-        return None
+        return None, None
     
     try:
         cursor = connection.cursor()
@@ -284,7 +450,7 @@ async def log_voice_leave(member, channel, join_time):
         
         result = cursor.fetchone()
         if not result:
-            return None
+            return None, None
         
         session_id, db_join_time = result
         leave_time = datetime.now()
@@ -297,32 +463,40 @@ async def log_voice_leave(member, channel, join_time):
             WHERE id = %s
         """, (leave_time, duration, session_id))
         
-        # Update user total time
-        cursor.execute("""
-            UPDATE user_stats
-            SET total_time_seconds = total_time_seconds + %s
-            WHERE guild_id = %s AND user_id = %s
-        """, (duration, member.guild.id, member.id))
-        
-        # Update daily stats
-        today = datetime.now().date()
-        cursor.execute("""
-            UPDATE daily_stats
-            SET time_seconds = time_seconds + %s, last_leave_time = %s
-            WHERE guild_id = %s AND user_id = %s AND date = %s
-        """, (duration, leave_time.time(), member.guild.id, member.id, today))
+        stats_update = (apply_leave_stats, (member.guild.id, member.id, duration, leave_time))
+        if hold_stats:
+            held = stats_update
+        else:
+            held = None
+            stats_update[0](cursor, *stats_update[1])
         
         connection.commit()
-        return duration
+        return duration, held
         
     except mysql.connector.Error as err:
-        logger.error(f"Failed to log voice leave: {err}")
-        return None
+        logger.error("Failed to log voice leave: %s", err, extra=log_context(member, channel))
+        return None, None
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+def apply_leave_stats(cursor, guild_id, user_id, duration, left_at):
+    """Add a finished session's time to user_stats and daily_stats"""
+    # Update user total time
+    cursor.execute("""
+        UPDATE user_stats
+        SET total_time_seconds = total_time_seconds + %s
+        WHERE guild_id = %s AND user_id = %s
+    """, (duration, guild_id, user_id))
+    
+    # Update daily stats
+    cursor.execute("""
+        UPDATE daily_stats
+        SET time_seconds = time_seconds + %s, last_leave_time = %s
+        WHERE guild_id = %s AND user_id = %s AND date = %s
+    """, (duration, left_at.time(), guild_id, user_id, left_at.date()))
+
 def get_first_text_channel(guild):
     """Get the first available text channel in the guild"""
     for channel in guild.text_channels:
@@ -333,8 +507,8 @@ def get_first_text_channel(guild):
 @bot.event
 async def on_ready():
     """Bot startup event"""
-    logger.info(f'{bot.user} has connected to Discord!')
-    logger.info(f'Bot is in {len(bot.guilds)} guild(s)')
+    logger.info('%s has connected to Discord!', bot.user)
+    logger.info('Bot is in %d guild(s)', len(bot.guilds))
     
     # Initialize database
     if init_database():
@@ -342,31 +516,583 @@ async def on_ready():
     else:
         logger.error("Database initialization failed!")
     
+    # Rebuild who's-in-voice index from the gateway cache
+    seed_presence_index()
+    
+    # Start Home Assistant push worker (no-op when not configured)
+    start_ha_worker()
+    
+    # Start watching for voice-event storms
+    start_overload_monitor()
+    
     # Start daily stats task
     daily_leaderboard.start()
     
     # Sync slash commands
     try:
         synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
+        logger.info("Synced %d command(s)", len(synced))
     except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+        logger.error("Failed to sync commands: %s", e)
 
 # Track active voice sessions for duration calculation
 active_sessions = {}
 
+# Live voice presence: guild_id -> channel_id -> user_id -> (display_name, joined_at)
+presence_index = {}
+
+def presence_join(guild_id, channel_id, member, joined_at=None):
+    """Record a member as present in a voice channel"""
+    channels = presence_index.setdefault(guild_id, {})
+    channels.setdefault(channel_id, {})[member.id] = (member.display_name, joined_at or datetime.now())
+
+def presence_leave(guild_id, channel_id, user_id):
+    """Remove a member from a voice channel, dropping empty entries"""
+    channels = presence_index.get(guild_id)
+    if not channels:
+        return
+    occupants = channels.get(channel_id)
+    if occupants is None:
+        return
+    occupants.pop(user_id, None)
+    if not occupants:
+        del channels[channel_id]
+    if not channels:
+        del presence_index[guild_id]
+
+def update_presence(member, before, after):
+    """Apply a voice state change to the presence index, returning True if anyone moved"""
+    if before.channel == after.channel:
+        return False  # mute/deafen/stream toggles don't move anyone
+    if before.channel is not None:
+        presence_leave(member.guild.id, before.channel.id, member.id)
+    if after.channel is not None:
+        presence_join(member.guild.id, after.channel.id, member)
+    return True
+
+def seed_presence_index():
+    """Rebuild the presence index from the voice channels the bot can see"""
+    previous = {
+        (guild_id, user_id): joined_at
+        for guild_id, channels in presence_index.items()
+        for occupants in channels.values()
+        for user_id, (_, joined_at) in occupants.items()
+    }
+    presence_index.clear()
+    
+    for guild in bot.guilds:
+        for voice_channel in list(guild.voice_channels) + list(guild.stage_channels):
+            for member in voice_channel.members:
+                if member.bot:
+                    continue
+                joined_at = previous.get((guild.id, member.id)) or active_sessions.get(
+                    f"{guild.id}_{member.id}_{voice_channel.id}"
+                )
+                presence_join(guild.id, voice_channel.id, member, joined_at)
+    
+    total = sum(len(o) for c in presence_index.values() for o in c.values())
+    logger.info("Presence index seeded with %d member(s) in voice", total)
+    
+    for guild in bot.guilds:
+        ha_publish_guild(guild)
+
+def presence_snapshot(guild_id):
+    """Copy a guild's presence as (user_id, channel_id) -> joined_at, safe to use off the event loop"""
+    return {
+        (user_id, channel_id): joined_at
+        for channel_id, occupants in presence_index.get(guild_id, {}).items()
+        for user_id, (_, joined_at) in occupants.items()
+    }
+
+# Home Assistant presence push: latest state per entity, flushed by one worker
+ha_pending = {}  # entity_id -> payload, newer updates overwrite older ones
+ha_wakeup = asyncio.Event()
+ha_worker = None
+ha_dropped = 0
+
+def ha_enabled():
+    """Check whether Home Assistant push is configured"""
+    return bool(HA_URL and HA_TOKEN)
+
+def ha_queue(entity_id, payload, replace=True):
+    """Put a payload in the bounded pending map, counting it if there's no room"""
+    global ha_dropped
+    if entity_id in ha_pending:
+        if replace:
+            ha_pending[entity_id] = payload
+        return True
+    
+    if len(ha_pending) >= HA_MAX_PENDING:
+        ha_dropped += 1
+        logger.warning("Home Assistant queue full, dropped update for %s (%d dropped)", entity_id, ha_dropped)
+        return False
+    
+    ha_pending[entity_id] = payload
+    return True
+
+def ha_publish(entity_id, state, attributes):
+    """Queue a state write for an entity without ever waiting on Home Assistant"""
+    if not ha_enabled():
+        return
+    
+    if ha_queue(entity_id, {'state': state, 'attributes': attributes}):
+        ha_wakeup.set()
+
+def ha_publish_guild(guild):
+    """Queue the guild's current voice occupancy for Home Assistant"""
+    channels = {}
+    for channel_id, occupants in presence_index.get(guild.id, {}).items():
+        voice_channel = guild.get_channel(channel_id)
+        channel_name = voice_channel.name if voice_channel else str(channel_id)
+        channels[channel_name] = sorted(name for name, _ in occupants.values())
+    
+    ha_publish(
+        f"sensor.funkbot_voice_{guild.id}",
+        sum(len(members) for members in channels.values()),
+        {
+            'friendly_name': f"{guild.name} Voice",
+            'unit_of_measurement': 'users',
+            'icon': 'mdi:headset',
+            'channels': channels,
+            'active_channels': len(channels),
+        }
+    )
+
+async def ha_push_state(session, entity_id, payload):
+    """Write one entity state to the Home Assistant REST API"""
+    async with session.post(f"{HA_URL}/api/states/{entity_id}", json=payload) as response:
+        if response.status >= 400:
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history,
+                status=response.status, message=await response.text()
+            )
+
+async def ha_push_worker():
+    """Coalesce queued presence updates and push them over one pooled session"""
+    backoff = 0
+    session = aiohttp.ClientSession(
+        headers={'Authorization': f"Bearer {HA_TOKEN}"},
+        timeout=aiohttp.ClientTimeout(total=10),
+        connector=aiohttp.TCPConnector(limit=2, keepalive_timeout=60)
+    )
+    
+    try:
+        while True:
+            await ha_wakeup.wait()
+            # Let a burst of voice events settle into one write per entity
+            await asyncio.sleep(max(HA_COALESCE_SECONDS, backoff))
+            ha_wakeup.clear()
+            
+            batch = dict(ha_pending)
+            ha_pending.clear()
+            
+            items = list(batch.items())
+            for index, (entity_id, payload) in enumerate(items):
+                try:
+                    await ha_push_state(session, entity_id, payload)
+                    backoff = 0
+                except Exception as e:
+                    # Requeue what's left unless newer states arrived meanwhile, then back off
+                    backoff = min(max(backoff * 2, HA_COALESCE_SECONDS or 1), HA_MAX_BACKOFF_SECONDS)
+                    logger.warning("Home Assistant push failed for %s: %s (retrying in %.0fs)", entity_id, e, backoff)
+                    for retry_id, retry_payload in items[index:]:
+                        ha_queue(retry_id, retry_payload, replace=False)
+                    break
+            
+            if ha_pending:
+                ha_wakeup.set()
+    finally:
+        await session.close()
+
+def start_ha_worker():
+    """Start the Home Assistant push worker once"""
+    global ha_worker
+    if not ha_enabled() or ha_worker is not None:
+        return
+    ha_worker = asyncio.create_task(ha_push_worker())
+    logger.info("Home Assistant presence push enabled (%s)", HA_URL)
+
+async def stop_ha_worker():
+    """Cancel the Home Assistant push worker so it closes its session"""
+    global ha_worker
+    if ha_worker is None:
+        return
+    ha_worker.cancel()
+    try:
+        await ha_worker
+    except asyncio.CancelledError:
+        pass
+    ha_worker = None
+
+# Load shedding: detect voice-event storms and degrade announcements/stats until they pass
+voice_event_times = deque()
+overload = {'active': False, 'since': None, 'calm_since': None, 'loop_lag_ms': 0.0}
+shed_stats = {
+    'activations': 0,
+    'last_activated': None,
+    'last_cleared': None,
+    'seconds_in_overload': 0.0,
+    'announcements_summarised': 0,
+    'summaries_posted': 0,
+    'summaries_failed': 0,
+    'summary_embeds_dropped': 0,
+    'summary_announcements_dropped': 0,
+    'stats_updates_deferred': 0,
+    'stats_updates_replayed': 0,
+    'stats_updates_dropped': 0,
+    'stats_updates_failed': 0,
+    'db_gate_waits': 0,
+    'db_gate_peak_waiting': 0,
+}
+deferred_stats = deque()  # {'apply', 'args', 'failures'} in event order
+failed_stats = deque(maxlen=100)  # entries that kept failing on replay, kept for inspection
+pending_summaries = {}  # text channel -> voice channel name -> {'joined': [...], 'left': [...], 'moved': [...]}
+announce_semaphore = asyncio.Semaphore(MAX_INFLIGHT_ANNOUNCEMENTS)
+db_gate = asyncio.Semaphore(MAX_INFLIGHT_DB)
+db_gate_waiting = 0
+member_locks = {}  # (guild_id, user_id) -> [lock, users], keeps each member's events in order
+overload_monitor_task = None
+
+def voice_event_rate():
+    """Voice events per second over the sliding rate window"""
+    cutoff = time.monotonic() - OVERLOAD_RATE_WINDOW_SECONDS
+    while voice_event_times and voice_event_times[0] < cutoff:
+        voice_event_times.popleft()
+    return len(voice_event_times) / OVERLOAD_RATE_WINDOW_SECONDS
+
+def note_voice_event():
+    """Record a voice event and switch to overload mode if the rate spikes"""
+    voice_event_times.append(time.monotonic())
+    if voice_event_rate() > OVERLOAD_EVENT_RATE:
+        overload['calm_since'] = None
+        if not overload['active']:
+            enter_overload("event rate")
+
+def enter_overload(reason):
+    """Start shedding load"""
+    overload['active'] = True
+    overload['since'] = time.monotonic()
+    overload['calm_since'] = None
+    shed_stats['activations'] += 1
+    shed_stats['last_activated'] = datetime.now()
+    logger.warning("Overload mode on (%s): %.1f events/s, loop lag %.0fms",
+                   reason, voice_event_rate(), overload['loop_lag_ms'])
+
+def exit_overload():
+    """Stop shedding load"""
+    shed_stats['seconds_in_overload'] += time.monotonic() - overload['since']
+    shed_stats['last_cleared'] = datetime.now()
+    overload['active'] = False
+    overload['since'] = None
+    overload['calm_since'] = None
+    logger.warning("Overload mode off: %d announcement(s) summarised, %d stats update(s) deferred so far",
+                   shed_stats['announcements_summarised'], shed_stats['stats_updates_deferred'])
+
+def stats_deferred():
+    """Whether aggregate stats writes should be queued instead of applied now"""
+    # Keep deferring until the backlog drains so updates are applied in event order
+    return overload['active'] or bool(deferred_stats)
+
+def defer_stats(apply, args):
+    """Queue a user_stats/daily_stats update for later, dropping it if the queue is full"""
+    if len(deferred_stats) >= MAX_DEFERRED_STATS:
+        # Applying it now would jump ahead of queued updates (e.g. a leave before its join)
+        shed_stats['stats_updates_dropped'] += 1
+        logger.warning("Deferred stats queue full, dropped %s%s", apply.__name__, args)
+        return False
+    deferred_stats.append({'apply': apply, 'args': args, 'failures': 0})
+    shed_stats['stats_updates_deferred'] += 1
+    return True
+
+def replay_deferred_stats(limit=200):
+    """Apply queued stats updates in order, setting aside any that keep failing (blocking)
+
+    Returns (replayed, failed) so counters are updated on the event loop.
+    """
+    connection = get_db_connection()
+    if not connection:
+        return 0, 0
+    
+    replayed = 0
+    failed = 0
+    try:
+        cursor = connection.cursor()
+        while deferred_stats and replayed < limit:
+            entry = deferred_stats[0]
+            try:
+                entry['apply'](cursor, *entry['args'])
+                connection.commit()
+            except Exception as e:
+                try:
+                    connection.rollback()
+                except mysql.connector.Error:
+                    pass
+                entry['failures'] += 1
+                if entry['failures'] < STATS_REPLAY_MAX_ATTEMPTS:
+                    logger.error("Failed to replay deferred stats (attempt %d): %s", entry['failures'], e)
+                    break
+                
+                # Don't let one bad update block everything queued behind it
+                failed_stats.append(deferred_stats.popleft())
+                failed += 1
+                logger.error("Gave up on deferred stats update %s%s after %d attempts: %s",
+                             entry['apply'].__name__, entry['args'], entry['failures'], e)
+                continue
+            
+            deferred_stats.popleft()
+            replayed += 1
+        
+        if replayed:
+            logger.info("Replayed %d deferred stats update(s), %d left", replayed, len(deferred_stats))
+    except mysql.connector.Error as err:
+        logger.error("Failed to replay deferred stats: %s", err)
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+    return replayed, failed
+
+async def drain_deferred_stats():
+    """Replay a batch of deferred stats through the DB gate and record the outcome"""
+    replayed, failed = await run_db_work(replay_deferred_stats)
+    shed_stats['stats_updates_replayed'] += replayed
+    shed_stats['stats_updates_failed'] += failed
+    return replayed, failed
+
+async def run_db_work(func, *args):
+    """Run blocking DB work in a worker thread, at most MAX_INFLIGHT_DB at a time"""
+    global db_gate_waiting
+    if db_gate.locked():
+        # Gate is full: count it and queue up behind the in-flight work
+        shed_stats['db_gate_waits'] += 1
+        db_gate_waiting += 1
+        shed_stats['db_gate_peak_waiting'] = max(shed_stats['db_gate_peak_waiting'], db_gate_waiting)
+        try:
+            await db_gate.acquire()
+        finally:
+            db_gate_waiting -= 1
+    else:
+        await db_gate.acquire()
+    
+    try:
+        return await asyncio.to_thread(func, *args)
+    finally:
+        db_gate.release()
+
+async def run_bookkeeping(func, member, *args):
+    """Run session bookkeeping for a member through the DB gate, in event order per member"""
+    key = (member.guild.id, member.id)
+    holder = member_locks.setdefault(key, [asyncio.Lock(), 0])
+    holder[1] += 1
+    try:
+        async with holder[0]:
+            # Decide and queue deferred stats here on the loop thread, never in the worker
+            result, held = await run_db_work(func, member, *args, stats_deferred())
+            if held:
+                defer_stats(*held)
+            return result
+    finally:
+        holder[1] -= 1
+        if not holder[1]:
+            del member_locks[key]
+
+def summarise_announcement(text_channel, kind, member, voice_channel):
+    """Fold an announcement into the next per-channel summary"""
+    channels = pending_summaries.setdefault(text_channel, {})
+    entry = channels.setdefault(voice_channel.name, {'joined': [], 'left': [], 'moved': []})
+    entry[kind].append(member.display_name)
+    shed_stats['announcements_summarised'] += 1
+
+def format_summary_names(names, limit=5):
+    """Format a short list of names for a summary line"""
+    shown = ", ".join(names[:limit])
+    if len(names) > limit:
+        shown += f" +{len(names) - limit} more"
+    return shown
+
+async def send_announcement(channel, embed, delete_after=None, reaction=None):
+    """Send an announcement, bounding how many are in flight at once"""
+    async with announce_semaphore:
+        message = await channel.send(embed=embed, delete_after=delete_after)
+        if reaction:
+            await message.add_reaction(reaction)
+        return message
+
+def new_summary_embed():
+    """Start an empty voice summary embed"""
+    embed = discord.Embed(
+        title="📣 Voice Activity Summary",
+        description="Things got busy, so here's the roundup!",
+        color=0x95a5a6,
+        timestamp=datetime.now()
+    )
+    embed.set_footer(text="FunkBot")
+    return embed
+
+def build_summary_embeds(channels):
+    """Pack per-voice-channel summaries into embeds within Discord's field and size limits
+
+    Returns a list of (embed, announcement count) pairs.
+    """
+    embeds = []
+    embed = new_summary_embed()
+    count = 0
+    
+    for channel_name, entry in channels.items():
+        lines = []
+        if entry['joined']:
+            lines.append(f"➕ **{len(entry['joined'])}** joined: {format_summary_names(entry['joined'])}")
+        if entry['moved']:
+            lines.append(f"🔄 **{len(entry['moved'])}** moved in: {format_summary_names(entry['moved'])}")
+        if entry['left']:
+            lines.append(f"👋 **{len(entry['left'])}** left: {format_summary_names(entry['left'])}")
+        name = f"🔊 {channel_name}"[:EMBED_FIELD_NAME_LIMIT]
+        value = "\n".join(lines)[:EMBED_FIELD_VALUE_LIMIT]
+        
+        if embed.fields and (len(embed.fields) >= EMBED_MAX_FIELDS
+                             or len(embed) + len(name) + len(value) > EMBED_TOTAL_LIMIT):
+            embeds.append((embed, count))
+            embed = new_summary_embed()
+            count = 0
+        
+        embed.add_field(name=name, value=value, inline=False)
+        count += len(entry['joined']) + len(entry['moved']) + len(entry['left'])
+    
+    if embed.fields:
+        embeds.append((embed, count))
+    return embeds
+
+async def flush_announcement_summaries():
+    """Post summary embeds for each announcement channel"""
+    summaries = dict(pending_summaries)
+    pending_summaries.clear()
+    
+    for text_channel, channels in summaries.items():
+        embeds = build_summary_embeds(channels)
+        
+        # Don't turn one storm into a flood of summary messages
+        for embed, count in embeds[MAX_SUMMARY_EMBEDS:]:
+            shed_stats['summary_embeds_dropped'] += 1
+            shed_stats['summary_announcements_dropped'] += count
+        if len(embeds) > MAX_SUMMARY_EMBEDS:
+            logger.warning("Dropped %d voice summary embed(s) for %s", len(embeds) - MAX_SUMMARY_EMBEDS, text_channel.name)
+        
+        for embed, count in embeds[:MAX_SUMMARY_EMBEDS]:
+            try:
+                await send_announcement(text_channel, embed, delete_after=300)
+                shed_stats['summaries_posted'] += 1
+            except Exception as e:
+                shed_stats['summaries_failed'] += 1
+                shed_stats['summary_announcements_dropped'] += count
+                logger.error("Failed to post voice summary: %s", e)
+
+async def overload_monitor():
+    """Measure event-loop lag, toggle overload mode and drain deferred work"""
+    interval = 1.0
+    last_summary = time.monotonic()
+    
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        overload['loop_lag_ms'] = max(0.0, (time.perf_counter() - started - interval) * 1000)
+        
+        try:
+            now = time.monotonic()
+            hot = voice_event_rate() > OVERLOAD_EVENT_RATE or overload['loop_lag_ms'] > OVERLOAD_LOOP_LAG_MS
+            
+            if hot:
+                overload['calm_since'] = None
+                if not overload['active']:
+                    enter_overload("loop lag")
+            elif overload['active']:
+                if overload['calm_since'] is None:
+                    overload['calm_since'] = now
+                elif now - overload['calm_since'] >= OVERLOAD_COOLDOWN_SECONDS:
+                    exit_overload()
+            
+            if pending_summaries and (not overload['active'] or now - last_summary >= OVERLOAD_SUMMARY_SECONDS):
+                last_summary = now
+                await flush_announcement_summaries()
+            
+            if deferred_stats and not overload['active']:
+                await drain_deferred_stats()
+        except Exception as e:
+            logger.error("Overload monitor error: %s", e)
+
+def start_overload_monitor():
+    """Start the overload monitor once"""
+    global overload_monitor_task
+    if overload_monitor_task is None:
+        overload_monitor_task = asyncio.create_task(overload_monitor())
+
+async def stop_overload_monitor():
+    """Cancel the overload monitor"""
+    global overload_monitor_task
+    if overload_monitor_task is None:
+        return
+    overload_monitor_task.cancel()
+    try:
+        await overload_monitor_task
+    except asyncio.CancelledError:
+        pass
+    overload_monitor_task = None
+
+async def shutdown_load_shedding(timeout=None):
+    """Flush summaries and replay deferred stats before exit, counting whatever is left as dropped"""
+    await stop_overload_monitor()
+    deadline = time.monotonic() + (SHUTDOWN_DRAIN_SECONDS if timeout is None else timeout)
+    
+    if pending_summaries:
+        try:
+            await asyncio.wait_for(flush_announcement_summaries(), max(deadline - time.monotonic(), 0.1))
+        except asyncio.TimeoutError:
+            logger.warning("Timed out posting voice summaries during shutdown")
+    
+    while deferred_stats and time.monotonic() < deadline:
+        replayed, failed = await drain_deferred_stats()
+        if not replayed and not failed:
+            await asyncio.sleep(0.5)  # DB unavailable or an update being retried
+    
+    # Anything still buffered in memory is lost when the process exits
+    for channels in pending_summaries.values():
+        for entry in channels.values():
+            shed_stats['summary_announcements_dropped'] += len(entry['joined']) + len(entry['moved']) + len(entry['left'])
+    pending_summaries.clear()
+    
+    if deferred_stats:
+        shed_stats['stats_updates_dropped'] += len(deferred_stats)
+        logger.warning("Dropped %d deferred stats update(s) at shutdown", len(deferred_stats))
+        deferred_stats.clear()
+    
+    logger.info("Load shedding shut down: %d stats update(s) dropped, %d announcement(s) lost in total",
+                shed_stats['stats_updates_dropped'], shed_stats['summary_announcements_dropped'])
+
 @bot.event
 async def on_voice_state_update(member, before, after):
     """Handle voice state changes - the heart of our bot!"""
+    started = time.perf_counter()
+    note_voice_event()
+    try:
+        await handle_voice_state_update(member, before, after)
+    finally:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Voice state update handled", extra=log_context(member, after.channel or before.channel, started))
+
+async def handle_voice_state_update(member, before, after):
+    """Track sessions and announce joins, leaves and switches"""
     # Don't track bots
     if member.bot:
         return
     
+    # Keep the live presence index current before anything can bail out
+    if update_presence(member, before, after):
+        ha_publish_guild(member.guild)
+    
     guild = member.guild
     channel = get_first_text_channel(guild)
     
     if channel is None:
-        logger.warning(f"No text channel available in {guild.name}")
+        logger.warning("No text channel available in %s", guild.name, extra=log_context(member))
         return
     
     # User joined a voice channel (from nothing)
@@ -376,7 +1102,12 @@ async def on_voice_state_update(member, before, after):
         active_sessions[session_key] = datetime.now()
         
         # Log to database
-        session_id = await log_voice_join(member, after.channel)
+        session_id = await run_bookkeeping(log_voice_join, member, after.channel)
+        
+        # During a storm, fold the announcement into the periodic summary
+        if overload['active']:
+            summarise_announcement(channel, 'joined', member, after.channel)
+            return
         
         # Create rich embed message
         embed = discord.Embed(
@@ -391,13 +1122,14 @@ async def on_voice_state_update(member, before, after):
         embed.set_footer(text=f"Join #{session_id}" if session_id else "FunkBot")
         
         try:
-            message = await channel.send(embed=embed, delete_after=300)
-            await message.add_reaction("👋")
-            logger.info(f"Announced join: {member.display_name} -> {after.channel.name}")
+            await send_announcement(channel, embed, delete_after=300, reaction="👋")
+            logger.info("Announced join: %s -> %s", member.display_name, after.channel.name,
+                        extra=log_context(member, after.channel))
         except discord.errors.Forbidden:
-            logger.error(f"No permission to send messages in {channel.name if channel else 'unknown channel'}")
+            logger.error("No permission to send messages in %s", channel.name if channel else 'unknown channel',
+                         extra=log_context(member, after.channel))
         except Exception as e:
-            logger.error(f"Failed to announce join: {e}")
+            logger.error("Failed to announce join: %s", e, extra=log_context(member, after.channel))
     
     # User left a voice channel (to nothing)
     elif before.channel is not None and after.channel is None:
@@ -405,9 +1137,13 @@ async def on_voice_state_update(member, before, after):
         join_time = active_sessions.pop(session_key, None)
         
         if join_time:
-            duration = await log_voice_leave(member, before.channel, join_time)
+            duration = await run_bookkeeping(log_voice_leave, member, before.channel, join_time)
             
             if duration and duration > 60:  # Only announce if they were there for more than 1 minute
+                if overload['active']:
+                    summarise_announcement(channel, 'left', member, before.channel)
+                    return
+                
                 embed = discord.Embed(
                     description=random.choice(LEAVE_MESSAGES).format(
                         user=member.display_name,
@@ -421,11 +1157,11 @@ async def on_voice_state_update(member, before, after):
                 embed.set_footer(text="FunkBot")
                 
                 try:
-                    message = await channel.send(embed=embed, delete_after=180)
-                    await message.add_reaction("👋")
-                    logger.info(f"Announced leave: {member.display_name} <- {before.channel.name} ({format_duration(duration)})")
+                    await send_announcement(channel, embed, delete_after=180, reaction="👋")
+                    logger.info("Announced leave: %s <- %s (%s)", member.display_name, before.channel.name,
+                                format_duration(duration), extra=log_context(member, before.channel))
                 except Exception as e:
-                    logger.error(f"Failed to announce leave: {e}")
+                    logger.error("Failed to announce leave: %s", e, extra=log_context(member, before.channel))
     
     # User switched voice channels (from one channel to another)
     elif before.channel is not None and after.channel is not None and before.channel != after.channel:
@@ -434,9 +1170,11 @@ async def on_voice_state_update(member, before, after):
         join_time = active_sessions.pop(session_key_old, None)
         
         if join_time:
-            duration = await log_voice_leave(member, before.channel, join_time)
+            duration = await run_bookkeeping(log_voice_leave, member, before.channel, join_time)
             
-            if duration and duration > 10:  # Only announce if they were there for more than 10 seconds
+            if duration and duration > 10 and overload['active']:
+                summarise_announcement(channel, 'moved', member, after.channel)
+            elif duration and duration > 10:  # Only announce if they were there for more than 10 seconds
                 embed = discord.Embed(
                     description=f"🔄 **{member.display_name}** moved from **{before.channel.name}** to **{after.channel.name}** (was there {format_duration(duration)})",
                     color=0xffa500,
@@ -446,20 +1184,21 @@ async def on_voice_state_update(member, before, after):
                 embed.set_footer(text="FunkBot")
                 
                 try:
-                    message = await channel.send(embed=embed, delete_after=240)
-                    await message.add_reaction("🔄")
-                    logger.info(f"Announced channel switch: {member.display_name} {before.channel.name} -> {after.channel.name} ({format_duration(duration)})")
+                    await send_announcement(channel, embed, delete_after=240, reaction="🔄")
+                    logger.info("Announced channel switch: %s %s -> %s (%s)", member.display_name, before.channel.name,
+                                after.channel.name, format_duration(duration), extra=log_context(member, after.channel))
                 except Exception as e:
-                    logger.error(f"Failed to announce channel switch: {e}")
+                    logger.error("Failed to announce channel switch: %s", e, extra=log_context(member, after.channel))
         
         # Now handle the new channel join
         session_key_new = f"{guild.id}_{member.id}_{after.channel.id}"
         active_sessions[session_key_new] = datetime.now()
         
-        session_id = await log_voice_join(member, after.channel)
+        session_id = await run_bookkeeping(log_voice_join, member, after.channel)
         
         # Don't announce the join part of a switch to avoid spam
-        logger.info(f"Logged channel switch join: {member.display_name} -> {after.channel.name}")
+        logger.info("Logged channel switch join: %s -> %s", member.display_name, after.channel.name,
+                    extra=log_context(member, after.channel))
 # Slash Commands
 @bot.tree.command(name="stats", description="View your voice chat statistics")
 async def stats(interaction: discord.Interaction, user: Optional[discord.Member] = None):
@@ -542,7 +1281,7 @@ async def stats(interaction: discord.Interaction, user: Optional[discord.Member]
         await interaction.response.send_message(embed=embed)
         
     except Exception as e:
-        logger.error(f"Stats command error: {e}")
+        logger.error("Stats command error: %s", e)
         await interaction.response.send_message("❌ Error fetching stats!", ephemeral=True)
     finally:
         if connection.is_connected():
@@ -611,13 +1350,309 @@ async def leaderboard(interaction: discord.Interaction, timeframe: str = "today"
         await interaction.followup.send(embed=embed)
         
     except Exception as e:
-        logger.error(f"Leaderboard command error: {e}")
+        logger.error("Leaderboard command error: %s", e)
         await interaction.followup.send("❌ Error fetching leaderboard!")
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+# Voice activity analytics (sweep-line over voice_sessions)
+WEEKDAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+HEATMAP_SHADES = " ░▒▓█"
+
+# (guild_id, date, days) -> activity result, only valid for that day
+activity_cache = {}
+
+def compute_voice_activity(intervals, window_start, window_end):
+    """Sweep (start, end) intervals to find peak concurrency and an hour-of-week heatmap"""
+    events = []
+    for start, end in intervals:
+        start = max(start, window_start)
+        end = min(end, window_end)
+        if start < end:
+            events.append((start, 1))
+            events.append((end, -1))
+    
+    # Leaves sort before joins at the same instant so back-to-back sessions don't overlap
+    events.sort(key=lambda e: (e[0], e[1]))
+    
+    heatmap = [[0] * 24 for _ in range(7)]  # user-seconds per weekday/hour
+    current = 0
+    peak = 0
+    peak_time = None
+    previous_time = None
+    
+    for instant, delta in events:
+        # Spread the occupancy of the segment we just finished across hour buckets
+        if current and previous_time is not None:
+            cursor_time = previous_time
+            while cursor_time < instant:
+                hour_end = cursor_time.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+                segment_end = min(hour_end, instant)
+                heatmap[cursor_time.weekday()][cursor_time.hour] += current * (segment_end - cursor_time).total_seconds()
+                cursor_time = segment_end
+        
+        current += delta
+        previous_time = instant
+        if current > peak:
+            peak = current
+            peak_time = instant
+    
+    return {
+        'peak': peak,
+        'peak_time': peak_time,
+        'heatmap': heatmap,
+        'sessions': len(events) // 2,
+    }
+
+def select_activity_intervals(rows, present, window_end):
+    """Turn voice_sessions rows into (start, end) intervals, trusting open rows only when live"""
+    intervals = []
+    open_rows = {}  # (user_id, channel_id) -> newest open join_time
+    for user_id, channel_id, join_time, leave_time in rows:
+        if leave_time is None:
+            key = (user_id, channel_id)
+            open_rows[key] = max(join_time, open_rows.get(key, join_time))
+        else:
+            intervals.append((join_time, leave_time))
+    
+    # Open rows only count if the member is really still there, and older open rows
+    # (left while the bot was down) are ignored; never count from before they joined
+    for key, join_time in open_rows.items():
+        joined_at = present.get(key)
+        if joined_at is None:
+            continue
+        intervals.append((max(join_time, joined_at), window_end))
+    return intervals
+
+def fetch_voice_activity(guild_id, days, present):
+    """Load session intervals for the last `days` complete days and sweep them (blocking)
+
+    `present` is a presence_snapshot() taken on the event loop.
+    """
+    window_end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = window_end - timedelta(days=days)
+    
+    connection = get_db_connection()
+    if not connection:
+        return None
+    
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT user_id, channel_id, join_time, leave_time
+            FROM voice_sessions
+            WHERE guild_id = %s AND join_time < %s
+              AND (leave_time IS NULL OR leave_time > %s)
+        """, (guild_id, window_end, window_start))
+        
+        intervals = select_activity_intervals(cursor.fetchall(), present, window_end)
+        result = compute_voice_activity(intervals, window_start, window_end)
+        result['window_start'] = window_start
+        result['window_end'] = window_end
+        return result
+        
+    except mysql.connector.Error as err:
+        logger.error("Failed to load voice activity: %s", err)
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+async def get_voice_activity(guild_id, days):
+    """Return cached voice activity for today, computing it off the event loop on first request"""
+    today = datetime.now().date()
+    key = (guild_id, today, days)
+    if key in activity_cache:
+        return activity_cache[key]
+    
+    result = await run_db_work(fetch_voice_activity, guild_id, days, presence_snapshot(guild_id))
+    if result is None:
+        return None
+    
+    # Drop entries from previous days before caching the new one
+    for stale_key in [k for k in activity_cache if k[1] != today]:
+        del activity_cache[stale_key]
+    activity_cache[key] = result
+    return result
+
+def render_heatmap(heatmap):
+    """Render a 7x24 heatmap as a monospace block"""
+    highest = max(max(row) for row in heatmap)
+    lines = ["    " + "".join(f"{hour:<6}" for hour in (0, 6, 12, 18))]
+    for day, row in enumerate(heatmap):
+        cells = ""
+        for value in row:
+            if highest <= 0 or value <= 0:
+                cells += HEATMAP_SHADES[0]
+            else:
+                level = 1 + int((value / highest) * (len(HEATMAP_SHADES) - 2) + 0.5)
+                cells += HEATMAP_SHADES[min(level, len(HEATMAP_SHADES) - 1)]
+        lines.append(f"{WEEKDAY_NAMES[day]} {cells}")
+    return "```\n" + "\n".join(lines) + "\n```"
+
+voice_group = app_commands.Group(name="voice", description="Live voice presence and activity")
+
+def join_lines_within(lines, limit, overflow="+{} more"):
+    """Join whole lines up to `limit` characters, replacing the rest with a '+N more' line"""
+    text = ""
+    for index, line in enumerate(lines):
+        candidate = f"{text}\n{line}" if text else line
+        remaining = len(lines) - index - 1
+        tail = f"\n{overflow.format(remaining)}" if remaining else ""
+        if len(candidate) + len(tail) > limit:
+            more = overflow.format(len(lines) - index)
+            return f"{text}\n{more}" if text else more
+        text = candidate
+    return text
+
+def build_voice_now_embed(guild, channels, now):
+    """Build the /voice now embed within Discord's field and size limits"""
+    embed = discord.Embed(title="🎧 Who's in Voice Now", color=0x1abc9c, timestamp=now)
+    total = sum(len(o) for o in channels.values())
+    embed.set_footer(text=f"{total} in voice • FunkBot")
+    
+    # Busiest channels first, longest-present members first
+    ordered = sorted(channels.items(), key=lambda c: -len(c[1]))
+    for index, (channel_id, occupants) in enumerate(ordered):
+        voice_channel = guild.get_channel(channel_id)
+        channel_name = voice_channel.name if voice_channel else f"#{channel_id}"
+        name = f"🔊 {channel_name} ({len(occupants)})"[:EMBED_FIELD_NAME_LIMIT]
+        value = join_lines_within([
+            f"**{member_name}** • {format_duration(int((now - joined_at).total_seconds()))}"
+            for member_name, joined_at in sorted(occupants.values(), key=lambda o: o[1])
+        ], EMBED_FIELD_VALUE_LIMIT)
+        
+        # Leave room for a final "+N more channels" field
+        if (len(embed.fields) >= EMBED_MAX_FIELDS - 1
+                or len(embed) + len(name) + len(value) > EMBED_TOTAL_LIMIT - 100):
+            hidden = ordered[index:]
+            embed.add_field(
+                name=f"➕ +{len(hidden)} more channel(s)",
+                value=f"{sum(len(o) for _, o in hidden)} more in voice",
+                inline=False
+            )
+            break
+        
+        embed.add_field(name=name, value=value, inline=False)
+    
+    return embed
+
+@voice_group.command(name="now", description="See who's in voice right now")
+async def voice_now(interaction: discord.Interaction):
+    """Show current voice occupants from the presence index"""
+    channels = presence_index.get(interaction.guild_id, {})
+    
+    if not channels:
+        await interaction.response.send_message("🔇 Nobody is in voice right now!", ephemeral=True)
+        return
+    
+    embed = build_voice_now_embed(interaction.guild, channels, datetime.now())
+    await interaction.response.send_message(embed=embed)
+
+@voice_group.command(name="activity", description="Peak concurrency and busiest hours")
+@app_commands.describe(days="How many past days to include (1-90)")
+async def voice_activity(interaction: discord.Interaction, days: app_commands.Range[int, 1, 90] = 7):
+    """Show peak concurrent users and an hour-of-week heatmap"""
+    await interaction.response.defer()
+    
+    try:
+        result = await get_voice_activity(interaction.guild_id, days)
+        if result is None:
+            await interaction.followup.send("❌ Database connection failed!")
+            return
+        
+        if not result['sessions']:
+            await interaction.followup.send(f"No voice activity in the last {days} day(s)!")
+            return
+        
+        embed = discord.Embed(
+            title=f"📈 Voice Activity (last {days} day(s))",
+            color=0x3498db,
+            timestamp=datetime.now()
+        )
+        
+        peak_time = result['peak_time']
+        embed.add_field(
+            name="🏔️ Peak Concurrent",
+            value=f"**{result['peak']}** users\n{peak_time.strftime('%a %d %b %H:%M')}"
+        )
+        
+        current = sum(len(o) for o in presence_index.get(interaction.guild_id, {}).values())
+        embed.add_field(name="🎧 In Voice Now", value=f"**{current}** users")
+        
+        embed.add_field(name="🗓️ Sessions", value=f"**{result['sessions']:,}**")
+        
+        embed.add_field(
+            name="🔥 Hour-of-Week Heatmap",
+            value=render_heatmap(result['heatmap']),
+            inline=False
+        )
+        
+        embed.set_footer(text="FunkBot Activity • refreshed daily")
+        
+        await interaction.followup.send(embed=embed)
+        
+    except Exception as e:
+        logger.error("Voice activity command error: %s", e)
+        await interaction.followup.send("❌ Error fetching voice activity!")
+
+@voice_group.command(name="load", description="Show load-shedding status and counters")
+async def voice_load(interaction: discord.Interaction):
+    """Show whether overload mode is active and what it has shed"""
+    embed = discord.Embed(
+        title="🚦 Voice Event Load",
+        color=0xe74c3c if overload['active'] else 0x2ecc71,
+        timestamp=datetime.now()
+    )
+    
+    seconds_in_overload = shed_stats['seconds_in_overload']
+    if overload['active']:
+        seconds_in_overload += time.monotonic() - overload['since']
+    
+    embed.add_field(
+        name="📡 Now",
+        value=f"**Mode:** {'Overload' if overload['active'] else 'Normal'}\n"
+              f"**Events:** {voice_event_rate():.1f}/s\n"
+              f"**Loop lag:** {overload['loop_lag_ms']:.0f}ms\n"
+              f"**DB waiting:** {db_gate_waiting}"
+    )
+    
+    last_activated = shed_stats['last_activated']
+    last_cleared = shed_stats['last_cleared']
+    embed.add_field(
+        name="🕒 Shedding",
+        value=f"**Activations:** {shed_stats['activations']}\n"
+              f"**Total:** {format_duration(int(seconds_in_overload))}\n"
+              f"**Last on:** {last_activated.strftime('%d %b %H:%M:%S') if last_activated else 'never'}\n"
+              f"**Last off:** {last_cleared.strftime('%d %b %H:%M:%S') if last_cleared else 'never'}"
+    )
+    
+    embed.add_field(
+        name="📦 Degraded Work",
+        value=f"**Announcements summarised:** {shed_stats['announcements_summarised']:,}\n"
+              f"**Summaries posted:** {shed_stats['summaries_posted']:,}\n"
+              f"**Summaries failed:** {shed_stats['summaries_failed']:,}\n"
+              f"**Summary embeds dropped:** {shed_stats['summary_embeds_dropped']:,}\n"
+              f"**Announcements lost:** {shed_stats['summary_announcements_dropped']:,}\n"
+              f"**Stats deferred:** {shed_stats['stats_updates_deferred']:,}\n"
+              f"**Stats replayed:** {shed_stats['stats_updates_replayed']:,}\n"
+              f"**Stats pending:** {len(deferred_stats):,}\n"
+              f"**Stats dropped:** {shed_stats['stats_updates_dropped']:,}\n"
+              f"**Stats failed:** {shed_stats['stats_updates_failed']:,}\n"
+              f"**DB gate waits:** {shed_stats['db_gate_waits']:,} (peak queue {shed_stats['db_gate_peak_waiting']})\n"
+              f"**HA updates dropped:** {ha_dropped:,}",
+        inline=False
+    )
+    
+    embed.set_footer(text="FunkBot Load")
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+bot.tree.add_command(voice_group)
+
 @tasks.loop(hours=24)
 async def daily_leaderboard():
     """Post daily leaderboard at midnight"""
@@ -670,7 +1705,7 @@ async def daily_leaderboard():
                 await channel.send(embed=embed)
                 
         except Exception as e:
-            logger.error(f"Daily leaderboard error: {e}")
+            logger.error("Daily leaderboard error: %s", e)
         finally:
             if connection.is_connected():
                 cursor.close()
@@ -679,7 +1714,7 @@ async def daily_leaderboard():
 @bot.event
 async def on_error(event, *args, **kwargs):
     """Global error handler"""
-    logger.error(f"An error occurred in {event}: {args}")
+    logger.exception("An error occurred in %s", event)
 
 # Health check for Docker
 async def health_check():
@@ -697,5 +1732,5 @@ if __name__ == "__main__":
     try:
         bot.run(token, log_handler=None)
     except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
+        logger.error("Failed to start bot: %s", e)
         exit(1)
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# bot.py configures file logging at import time; keep it out of /app/logs
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='funkbot-logs-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,148 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import pytest
+from aiohttp import web
+
+import bot
+
+
+@pytest.fixture(autouse=True)
+def ha_config(monkeypatch):
+    """Point the bot at a stub Home Assistant with short timings"""
+    monkeypatch.setattr(bot, 'HA_TOKEN', 'test-token')
+    monkeypatch.setattr(bot, 'HA_COALESCE_SECONDS', 0.1)
+    monkeypatch.setattr(bot, 'HA_MAX_BACKOFF_SECONDS', 5)
+    monkeypatch.setattr(bot, 'HA_MAX_PENDING', 100)
+    monkeypatch.setattr(bot, 'ha_pending', {})
+    monkeypatch.setattr(bot, 'ha_dropped', 0)
+    monkeypatch.setattr(bot, 'ha_worker', None)
+
+
+@asynccontextmanager
+async def stub_home_assistant(monkeypatch, respond=None):
+    """Run a local HA REST stub recording every state write"""
+    requests = []
+
+    async def set_state(request):
+        requests.append({
+            'entity_id': request.match_info['entity_id'],
+            'payload': await request.json(),
+            'auth': request.headers.get('Authorization'),
+            'time': time.monotonic(),
+        })
+        if respond:
+            return await respond(len(requests))
+        return web.json_response({}, status=200)
+
+    app = web.Application()
+    app.router.add_post('/api/states/{entity_id}', set_state)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+
+    monkeypatch.setattr(bot, 'HA_URL', f"http://{host}:{port}")
+    monkeypatch.setattr(bot, 'ha_wakeup', asyncio.Event())
+    bot.start_ha_worker()
+    try:
+        yield requests
+    finally:
+        await bot.stop_ha_worker()
+        await runner.cleanup()
+
+
+async def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.02)
+
+
+def test_burst_is_coalesced_into_one_post_per_entity(monkeypatch):
+    async def scenario():
+        async with stub_home_assistant(monkeypatch) as requests:
+            for count in range(50):
+                bot.ha_publish('sensor.funkbot_voice_1', count, {'channels': {}})
+                bot.ha_publish('sensor.funkbot_voice_2', count * 2, {'channels': {}})
+
+            await wait_for(lambda: len(requests) >= 2)
+            await asyncio.sleep(0.3)
+            return requests
+
+    requests = asyncio.run(scenario())
+
+    assert sorted(r['entity_id'] for r in requests) == ['sensor.funkbot_voice_1', 'sensor.funkbot_voice_2']
+    latest = {r['entity_id']: r['payload']['state'] for r in requests}
+    assert latest == {'sensor.funkbot_voice_1': 49, 'sensor.funkbot_voice_2': 98}
+    assert all(r['auth'] == 'Bearer test-token' for r in requests)
+
+
+def test_server_errors_back_off_exponentially_and_requeue(monkeypatch):
+    async def fail_twice(attempt):
+        status = 503 if attempt <= 2 else 200
+        return web.json_response({}, status=status)
+
+    async def scenario():
+        async with stub_home_assistant(monkeypatch, respond=fail_twice) as requests:
+            bot.ha_publish('sensor.funkbot_voice_1', 3, {'channels': {}})
+            await wait_for(lambda: len(requests) >= 3)
+            await asyncio.sleep(0.05)
+            return requests
+
+    requests = asyncio.run(scenario())
+
+    assert len(requests) == 3
+    assert all(r['payload']['state'] == 3 for r in requests)
+    assert bot.ha_pending == {}
+    first_gap = requests[1]['time'] - requests[0]['time']
+    second_gap = requests[2]['time'] - requests[1]['time']
+    assert second_gap > first_gap * 1.5
+
+
+def test_full_queue_drops_and_counts_updates(monkeypatch):
+    monkeypatch.setattr(bot, 'HA_URL', 'http://127.0.0.1:9')
+    monkeypatch.setattr(bot, 'HA_MAX_PENDING', 2)
+    monkeypatch.setattr(bot, 'ha_wakeup', asyncio.Event())
+
+    bot.ha_publish('sensor.a', 1, {})
+    bot.ha_publish('sensor.b', 1, {})
+    bot.ha_publish('sensor.c', 1, {})
+    bot.ha_publish('sensor.a', 2, {})  # updating a queued entity still fits
+
+    assert set(bot.ha_pending) == {'sensor.a', 'sensor.b'}
+    assert bot.ha_pending['sensor.a']['state'] == 2
+    assert bot.ha_dropped == 1
+
+    # Requeues after a failed push respect the same bound and never clobber newer state
+    assert not bot.ha_queue('sensor.c', {'state': 0, 'attributes': {}}, replace=False)
+    bot.ha_queue('sensor.a', {'state': 1, 'attributes': {}}, replace=False)
+    assert bot.ha_pending['sensor.a']['state'] == 2
+    assert bot.ha_dropped == 2
+
+
+def test_publish_never_waits_on_home_assistant(monkeypatch):
+    assert not asyncio.iscoroutinefunction(bot.ha_publish)
+
+    async def hang(attempt):
+        await asyncio.sleep(2)
+        return web.json_response({})
+
+    async def scenario():
+        async with stub_home_assistant(monkeypatch, respond=hang) as requests:
+            bot.ha_publish('sensor.funkbot_voice_1', 0, {})
+            await wait_for(lambda: requests)
+
+            # HA is now stuck mid-request; publishing must still return immediately
+            started = time.perf_counter()
+            for count in range(1000):
+                assert bot.ha_publish('sensor.funkbot_voice_1', count, {}) is None
+            return time.perf_counter() - started
+
+    elapsed = asyncio.run(scenario())
+
+    assert elapsed < 0.5
+    assert bot.ha_pending['sensor.funkbot_voice_1']['state'] == 999
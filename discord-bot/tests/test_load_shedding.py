@@ -0,0 +1,262 @@
+import asyncio
+from collections import deque
+
+import mysql.connector
+import pytest
+
+import bot
+
+
+class FakeConnection:
+    """Minimal stand-in for a mysql.connector connection"""
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self):
+        return self
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def shedding_state(monkeypatch):
+    monkeypatch.setattr(bot, 'deferred_stats', deque())
+    monkeypatch.setattr(bot, 'failed_stats', deque(maxlen=100))
+    monkeypatch.setattr(bot, 'shed_stats', {key: 0 for key in bot.shed_stats})
+    monkeypatch.setattr(bot, 'overload', {'active': False, 'since': None, 'calm_since': None, 'loop_lag_ms': 0.0})
+    connection = FakeConnection()
+    monkeypatch.setattr(bot, 'get_db_connection', lambda: connection)
+    return connection
+
+
+def test_full_stats_queue_drops_and_counts_updates(monkeypatch):
+    monkeypatch.setattr(bot, 'MAX_DEFERRED_STATS', 2)
+    applied = []
+
+    def apply(cursor, value):
+        applied.append(value)
+
+    assert bot.defer_stats(apply, (1,))
+    assert bot.defer_stats(apply, (2,))
+    assert not bot.defer_stats(apply, (3,))
+    assert len(bot.deferred_stats) == 2
+    assert bot.shed_stats['stats_updates_dropped'] == 1
+    assert [entry['args'] for entry in bot.deferred_stats] == [(1,), (2,)]
+    assert applied == []  # never applied out of order
+
+
+def test_failing_update_is_set_aside_after_max_attempts(monkeypatch, shedding_state):
+    monkeypatch.setattr(bot, 'STATS_REPLAY_MAX_ATTEMPTS', 3)
+    applied = []
+
+    def apply(cursor, value):
+        if value == 'bad':
+            raise mysql.connector.Error("constraint failed")
+        applied.append(value)
+
+    for value in ('first', 'bad', 'after'):
+        bot.defer_stats(apply, (value,))
+
+    assert bot.replay_deferred_stats() == (1, 0)
+    assert bot.replay_deferred_stats() == (0, 0)
+    assert applied == ['first']
+    assert len(bot.deferred_stats) == 2
+
+    async def drain():
+        return await bot.drain_deferred_stats()
+
+    assert asyncio.run(drain()) == (1, 1)
+    assert applied == ['first', 'after']
+    assert not bot.deferred_stats
+    assert [entry['args'] for entry in bot.failed_stats] == [('bad',)]
+    assert bot.shed_stats['stats_updates_failed'] == 1
+    assert bot.shed_stats['stats_updates_replayed'] == 1  # counted on the loop by drain_deferred_stats()
+    assert shedding_state.rollbacks == 3
+    assert not bot.stats_deferred()
+
+
+def summary_entry(count, prefix):
+    return {'joined': [f"{prefix}{i}" for i in range(count)], 'left': [], 'moved': []}
+
+
+def test_summary_embeds_respect_discord_limits():
+    long_name = "x" * 90
+    channels = {f"{long_name}{i}": summary_entry(5, "member-with-a-long-display-name-") for i in range(60)}
+
+    embeds = bot.build_summary_embeds(channels)
+
+    assert sum(len(embed.fields) for embed, _ in embeds) == 60
+    assert sum(count for _, count in embeds) == 300
+    assert any(len(embed.fields) < bot.EMBED_MAX_FIELDS for embed, _ in embeds[:-1])  # split on size
+    for embed, _ in embeds:
+        assert len(embed.fields) <= bot.EMBED_MAX_FIELDS
+        assert len(embed) <= bot.EMBED_TOTAL_LIMIT
+
+
+def test_dropped_and_failed_summaries_are_counted(monkeypatch):
+    monkeypatch.setattr(bot, 'MAX_SUMMARY_EMBEDS', 2)
+    channels = {f"voice-{i}": summary_entry(1, "m") for i in range(bot.EMBED_MAX_FIELDS * 3)}
+
+    class FailingChannel:
+        name = "general"
+
+        async def send(self, **kwargs):
+            raise RuntimeError("400 Bad Request")
+
+    monkeypatch.setattr(bot, 'pending_summaries', {FailingChannel(): channels})
+    asyncio.run(bot.flush_announcement_summaries())
+
+    assert bot.shed_stats['summary_embeds_dropped'] == 1
+    assert bot.shed_stats['summaries_failed'] == 2
+    assert bot.shed_stats['summary_announcements_dropped'] == bot.EMBED_MAX_FIELDS * 3
+    assert bot.shed_stats['summaries_posted'] == 0
+
+
+def test_bookkeeping_is_gated_and_ordered_per_member(monkeypatch):
+    import threading
+    import time
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(bot, 'db_gate', asyncio.Semaphore(2))
+    monkeypatch.setattr(bot, 'member_locks', {})
+    in_flight = 0
+    peak = 0
+    calls = []
+    counter_lock = threading.Lock()
+
+    def bookkeeping(member, step, hold_stats):
+        nonlocal in_flight, peak
+        with counter_lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        time.sleep(0.02)
+        with counter_lock:
+            in_flight -= 1
+            calls.append((member.id, step))
+        return step, None
+
+    guild = SimpleNamespace(id=1)
+    members = [SimpleNamespace(id=user_id, guild=guild) for user_id in range(5)]
+
+    async def scenario():
+        return await asyncio.gather(*(
+            bot.run_bookkeeping(bookkeeping, member, step)
+            for step in range(3) for member in members
+        ))
+
+    results = asyncio.run(scenario())
+
+    assert results == [step for step in range(3) for _ in members]
+    assert peak <= 2
+    assert bot.shed_stats['db_gate_waits'] > 0
+    assert bot.shed_stats['db_gate_peak_waiting'] > 0
+    for member in members:
+        assert [step for user_id, step in calls if user_id == member.id] == [0, 1, 2]
+    assert bot.member_locks == {}
+
+
+def test_held_stats_are_queued_on_the_loop_in_member_order(monkeypatch):
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(bot, 'db_gate', asyncio.Semaphore(3))
+    monkeypatch.setattr(bot, 'member_locks', {})
+    monkeypatch.setattr(bot, 'MAX_DEFERRED_STATS', 4)
+    bot.overload['active'] = True
+    seen_hold = []
+
+    def apply(cursor, user_id, step):
+        pass
+
+    def bookkeeping(member, step, hold_stats):
+        seen_hold.append(hold_stats)
+        return step, (apply, (member.id, step)) if hold_stats else None
+
+    guild = SimpleNamespace(id=1)
+    members = [SimpleNamespace(id=user_id, guild=guild) for user_id in range(3)]
+
+    async def scenario():
+        await asyncio.gather(*(
+            bot.run_bookkeeping(bookkeeping, member, step)
+            for step in range(2) for member in members
+        ))
+
+    asyncio.run(scenario())
+
+    assert all(seen_hold)
+    assert len(bot.deferred_stats) == 4  # the cap holds even with concurrent workers
+    assert bot.shed_stats['stats_updates_deferred'] == 4
+    assert bot.shed_stats['stats_updates_dropped'] == 2
+    queued = [entry['args'] for entry in bot.deferred_stats]
+    for member in members:
+        steps = [step for user_id, step in queued if user_id == member.id]
+        assert steps == sorted(steps)
+
+
+def test_shutdown_replays_deferred_stats_and_flushes_summaries(monkeypatch):
+    applied = []
+    sent = []
+
+    def apply(cursor, value):
+        applied.append(value)
+
+    class Channel:
+        name = "general"
+
+        async def send(self, embed=None, **kwargs):
+            sent.append(embed)
+            return self
+
+    for value in range(5):
+        bot.defer_stats(apply, (value,))
+    monkeypatch.setattr(bot, 'pending_summaries', {Channel(): {'Lounge': summary_entry(2, "m")}})
+    monkeypatch.setattr(bot, 'overload_monitor_task', None)
+
+    asyncio.run(bot.shutdown_load_shedding(timeout=2))
+
+    assert applied == [0, 1, 2, 3, 4]
+    assert len(sent) == 1
+    assert not bot.deferred_stats and not bot.pending_summaries
+    assert bot.shed_stats['stats_updates_dropped'] == 0
+    assert bot.shed_stats['summary_announcements_dropped'] == 0
+
+
+def test_shutdown_counts_what_it_could_not_save(monkeypatch):
+    def apply(cursor, value):
+        pass
+
+    for value in range(3):
+        bot.defer_stats(apply, (value,))
+    monkeypatch.setattr(bot, 'get_db_connection', lambda: None)  # database is down
+    monkeypatch.setattr(bot, 'overload_monitor_task', None)
+
+    asyncio.run(bot.shutdown_load_shedding(timeout=0.2))
+
+    assert not bot.deferred_stats
+    assert bot.shed_stats['stats_updates_dropped'] == 3
+
+
+def test_shutdown_cancels_the_overload_monitor(monkeypatch):
+    monkeypatch.setattr(bot, 'overload_monitor_task', None)
+
+    async def scenario():
+        bot.start_overload_monitor()
+        task = bot.overload_monitor_task
+        await bot.shutdown_load_shedding(timeout=0.1)
+        return task
+
+    task = asyncio.run(scenario())
+
+    assert task.cancelled()
+    assert bot.overload_monitor_task is None
@@ -0,0 +1,134 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import sys
+from logging.handlers import QueueListener
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+class Mutable:
+    """Stands in for a live discord model whose state changes after logging"""
+
+    def __init__(self, state):
+        self.state = state
+
+    def __str__(self):
+        return self.state
+
+
+class Capture(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def queued_logger():
+    """A private logger feeding a DeferredQueueHandler"""
+    log_queue = queue.SimpleQueue()
+    test_logger = logging.getLogger('funkbot.tests.queued')
+    test_logger.handlers = [bot.DeferredQueueHandler(log_queue)]
+    test_logger.propagate = False
+    test_logger.setLevel(logging.DEBUG)
+    yield test_logger, log_queue
+    test_logger.handlers = []
+
+
+def json_record(message, *args, extra=None, exc_info=None):
+    record = logging.getLogger('funkbot.tests').makeRecord(
+        'funkbot.tests', logging.INFO, __file__, 1, message, args, exc_info, extra=extra
+    )
+    return json.loads(bot.JsonLogFormatter().format(record))
+
+
+def test_json_records_carry_context_fields():
+    entry = json_record("Announced join: %s -> %s", "alice", "Lounge",
+                        extra={'guild_id': 1, 'user_id': 2, 'channel_id': 3, 'duration_ms': 4.5})
+
+    assert entry['message'] == "Announced join: alice -> Lounge"
+    assert entry['level'] == 'INFO'
+    assert entry['logger'] == 'funkbot.tests'
+    assert 'time' in entry
+    assert (entry['guild_id'], entry['user_id'], entry['channel_id'], entry['duration_ms']) == (1, 2, 3, 4.5)
+
+
+def test_json_records_omit_missing_context_and_include_exceptions():
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        entry = json_record("failed", extra={'guild_id': 1}, exc_info=sys.exc_info())
+
+    assert entry['guild_id'] == 1
+    assert not {'user_id', 'channel_id', 'duration_ms'} & set(entry)
+    assert 'ValueError: boom' in entry['exc_info']
+
+
+def test_log_context_builds_extra_from_member_and_channel():
+    member = SimpleNamespace(id=2, guild=SimpleNamespace(id=1))
+    channel = SimpleNamespace(id=3)
+
+    context = bot.log_context(member, channel, started=0.0)
+
+    assert (context['guild_id'], context['user_id'], context['channel_id']) == (1, 2, 3)
+    assert context['duration_ms'] > 0
+
+
+def test_live_args_are_snapshotted_and_primitives_stay_lazy(queued_logger):
+    test_logger, log_queue = queued_logger
+    member = Mutable("before")
+
+    test_logger.info("%s joined %d channel(s)", member, 3)
+    member.state = "after"
+
+    record = log_queue.get_nowait()
+    assert record.msg == "%s joined %d channel(s)"  # not formatted on the logging thread
+    assert record.args == ("before", 3)
+    assert isinstance(record.args[1], int)
+    assert record.getMessage() == "before joined 3 channel(s)"
+
+
+def test_listener_formats_the_snapshot_not_the_mutated_object(queued_logger):
+    test_logger, log_queue = queued_logger
+    capture = Capture()
+    listener = QueueListener(log_queue, capture)
+    member = Mutable("before")
+
+    test_logger.info("member %s", member)
+    member.state = "after"
+    listener.start()
+    listener.stop()  # drains the queue
+
+    assert capture.messages == ["member before"]
+
+
+def test_rotated_logs_are_gzipped_json(tmp_path):
+    handler = bot.build_log_file_handler(str(tmp_path), max_bytes=300, backup_count=2)
+    try:
+        for count in range(20):
+            record = logging.getLogger('funkbot.tests').makeRecord(
+                'funkbot.tests', logging.INFO, __file__, 1, "line %d", (count,), None,
+                extra={'guild_id': count}
+            )
+            handler.handle(record)
+    finally:
+        handler.close()
+
+    files = sorted(os.listdir(tmp_path))
+    assert files == ['funkbot.log', 'funkbot.log.1.gz', 'funkbot.log.2.gz']
+
+    with gzip.open(tmp_path / 'funkbot.log.1.gz', 'rt', encoding='utf-8') as rotated:
+        entries = [json.loads(line) for line in rotated]
+    assert entries
+    assert all(entry['message'].startswith("line ") for entry in entries)
+
+    with open(tmp_path / 'funkbot.log', encoding='utf-8') as current:
+        assert json.loads(current.readline())['message'].startswith("line ")
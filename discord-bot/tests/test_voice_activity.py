@@ -0,0 +1,124 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import bot
+
+
+def test_join_lines_within_replaces_overflow_with_more():
+    lines = [f"line {i}" for i in range(100)]
+
+    text = bot.join_lines_within(lines, 60)
+
+    assert len(text) <= 60
+    kept = text.split("\n")[:-1]
+    assert kept == lines[:len(kept)]  # whole lines only
+    assert text.endswith(f"+{100 - len(kept)} more")
+    assert bot.join_lines_within(lines[:3], 60) == "line 0\nline 1\nline 2"
+
+
+def test_voice_now_embed_fits_discord_limits():
+    now = datetime(2026, 10, 12, 20, 0)
+    guild = SimpleNamespace(get_channel=lambda channel_id: SimpleNamespace(name=f"Voice Channel {channel_id}"))
+    channels = {
+        channel_id: {
+            user_id: (f"member-with-a-long-display-name-{user_id}", now - timedelta(minutes=user_id))
+            for user_id in range(channel_id * 100, channel_id * 100 + 40)
+        }
+        for channel_id in range(30)
+    }
+
+    embed = bot.build_voice_now_embed(guild, channels, now)
+
+    assert len(embed) <= bot.EMBED_TOTAL_LIMIT
+    assert len(embed.fields) <= bot.EMBED_MAX_FIELDS
+    assert all(len(field.value) <= bot.EMBED_FIELD_VALUE_LIMIT for field in embed.fields)
+    assert embed.fields[0].value.split("\n")[-1].endswith("more")
+    assert embed.fields[-1].name.startswith("➕ +")
+    assert embed.footer.text == "1200 in voice • FunkBot"
+
+
+MONDAY = datetime(2026, 10, 12)  # a Monday
+
+
+def test_back_to_back_sessions_do_not_overlap():
+    intervals = [
+        (MONDAY.replace(hour=9), MONDAY.replace(hour=10)),
+        (MONDAY.replace(hour=10), MONDAY.replace(hour=11)),
+    ]
+
+    result = bot.compute_voice_activity(intervals, MONDAY, MONDAY + timedelta(days=1))
+
+    assert result['peak'] == 1
+    assert result['peak_time'] == MONDAY.replace(hour=9)
+    assert result['sessions'] == 2
+
+
+def test_overlapping_sessions_set_the_peak():
+    intervals = [
+        (MONDAY.replace(hour=9), MONDAY.replace(hour=11)),
+        (MONDAY.replace(hour=10), MONDAY.replace(hour=12)),
+        (MONDAY.replace(hour=10, minute=30), MONDAY.replace(hour=10, minute=45)),
+    ]
+
+    result = bot.compute_voice_activity(intervals, MONDAY, MONDAY + timedelta(days=1))
+
+    assert result['peak'] == 3
+    assert result['peak_time'] == MONDAY.replace(hour=10, minute=30)
+
+
+def test_intervals_are_clipped_to_the_window():
+    window_start = MONDAY.replace(hour=10)
+    window_end = MONDAY.replace(hour=12)
+    intervals = [
+        (MONDAY.replace(hour=8), MONDAY.replace(hour=11)),   # starts before the window
+        (MONDAY.replace(hour=11), MONDAY.replace(hour=14)),  # ends after it
+        (MONDAY.replace(hour=6), MONDAY.replace(hour=7)),    # entirely outside
+    ]
+
+    result = bot.compute_voice_activity(intervals, window_start, window_end)
+
+    assert result['sessions'] == 2
+    heatmap = result['heatmap']
+    assert heatmap[0][8] == 0 and heatmap[0][9] == 0
+    assert heatmap[0][10] == 3600
+    assert heatmap[0][11] == 3600
+    assert heatmap[0][12] == 0 and heatmap[0][13] == 0
+
+
+def test_segment_across_hour_and_day_boundaries_is_split_into_buckets():
+    sunday = MONDAY - timedelta(days=1)
+    intervals = [
+        (sunday.replace(hour=23, minute=30), MONDAY.replace(hour=1, minute=15)),
+        (MONDAY.replace(hour=0, minute=30), MONDAY.replace(hour=0, minute=45)),
+    ]
+
+    result = bot.compute_voice_activity(intervals, sunday, MONDAY + timedelta(days=1))
+
+    heatmap = result['heatmap']
+    assert heatmap[6][23] == 1800        # Sunday 23:30-24:00
+    assert heatmap[0][0] == 3600 + 900   # Monday 00:00-01:00, plus the overlapping 15 minutes
+    assert heatmap[0][1] == 900          # Monday 01:00-01:15
+    assert sum(map(sum, heatmap)) == (105 + 15) * 60
+
+
+def test_only_newest_open_row_per_member_and_channel_counts():
+    window_end = MONDAY + timedelta(days=1)
+    stale_join = MONDAY - timedelta(days=20)
+    rejoin = MONDAY.replace(hour=18)
+    seeded_at = MONDAY.replace(hour=19)  # presence reseeded after a restart
+    rows = [
+        (1, 10, MONDAY.replace(hour=8), MONDAY.replace(hour=9)),  # closed session
+        (1, 10, stale_join, None),                                 # orphaned by a restart
+        (1, 10, rejoin, None),                                     # the real, current session
+        (2, 10, MONDAY.replace(hour=12), None),                    # open, but member has left
+        (3, 11, MONDAY.replace(hour=20), None),                    # open and present
+    ]
+    present = {(1, 10): seeded_at, (3, 11): MONDAY.replace(hour=20)}
+
+    intervals = bot.select_activity_intervals(rows, present, window_end)
+
+    assert sorted(intervals) == sorted([
+        (MONDAY.replace(hour=8), MONDAY.replace(hour=9)),
+        (seeded_at, window_end),  # newest open row, clamped to presence joined_at
+        (MONDAY.replace(hour=20), window_end),
+    ])